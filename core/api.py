@@ -12,11 +12,19 @@ from ninja.orm import create_schema
 from ninja.errors import HttpError
 from ninja.security import HttpBearer
 from ninja.responses import codes_4xx
-from imdb import IMDb
 
 from django.conf.global_settings import SECRET_KEY
 from .models import User, Movie, SavedMovie
-from .services import get_movie_detailed, OnlySupportMovieException
+from .querybudget import query_budget
+from .ratelimit import RateLimitExceeded, consume, ip_key, rate_limit
+from .services import (
+    get_cached_movie_details,
+    get_imdb_client,
+    get_movie_detailed,
+    parse_fields,
+    InvalidFieldsException,
+    OnlySupportMovieException,
+)
 from .schemas import (
     BaseCreateUserSchema,
     CreateUserSchema,
@@ -29,6 +37,8 @@ from .schemas import (
     RecoveryQuestionSchema,
     MovieSchema,
     MovieDetailsSchema,
+    SparseMovieSchema,
+    SparseMovieDetailsSchema,
     UpdateUserRequestSchema,
     UserSchema,
 )
@@ -45,6 +55,21 @@ class AuthBearer(HttpBearer):
 
 api = NinjaAPI(title="Favorite Movies API", version="1.0.0", auth=AuthBearer())
 
+FIND_MOVIES_RATE = "60/m"
+# tokens charged on top of the base one when a search has to call IMDb
+IMDB_SEARCH_COST = 4
+
+
+@api.exception_handler(RateLimitExceeded)
+def rate_limit_exceeded(request, exc):
+    response = api.create_response(
+        request,
+        MessageResponseSchema(message="Too many requests").dict(),
+        status=429,
+    )
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
 
 @api.get("/test_auth")
 def auth_route(request):
@@ -59,6 +84,7 @@ def create_user(request, user: CreateUserSchema):
 
 
 @api.get("/users", response=UserSchema, tags=["User"])
+@query_budget(1)
 def get_user(request):
     """
     Get authenticated user data
@@ -71,6 +97,7 @@ def get_user(request):
 @api.patch(
     "/users", response={200: UserSchema, 400: MessageResponseSchema}, tags=["User"]
 )
+@query_budget(2)
 def update_user(request, payload: UpdateUserRequestSchema):
     """
     Update authenticated user data
@@ -91,6 +118,8 @@ def update_user(request, payload: UpdateUserRequestSchema):
     response={201: TokenSchema, frozenset({403, 404}): MessageResponseSchema},
     tags=["Auth"],
 )
+@rate_limit("10/m", key=ip_key)
+@query_budget(1)
 def generate_token(request, credentials: UserCredentialsSchema):
     users = User.objects.filter(email=credentials.email)
     if not users:
@@ -117,6 +146,8 @@ def generate_token(request, credentials: UserCredentialsSchema):
     response={frozenset({200, 400, 404}): MessageResponseSchema},
     tags=["Auth"],
 )
+@rate_limit("5/m", key=ip_key)
+@query_budget(2)
 def recovery_password(request, payload: RecoveryPasswordRequestSchema):
     users = User.objects.filter(email=payload.email)
     if not users:
@@ -138,6 +169,8 @@ def recovery_password(request, payload: RecoveryPasswordRequestSchema):
     response={200: RecoveryQuestionSchema, 404: MessageResponseSchema},
     tags=["Auth"],
 )
+@rate_limit("10/m", key=ip_key)
+@query_budget(1)
 def get_recovery_question(request, payload: GetRecoveryQuestionRequestSchema):
     users = User.objects.filter(email=payload.email)
     if not users:
@@ -150,33 +183,41 @@ def get_recovery_question(request, payload: GetRecoveryQuestionRequestSchema):
 
 @api.get(
     "/movies",
-    response={200: List[MovieSchema], 400: MessageResponseSchema},
+    response={200: List[SparseMovieSchema], 400: MessageResponseSchema},
+    exclude_unset=True,
     tags=["Movies"],
 )
-def find_movies(request, name="", saved=False):
+@rate_limit(FIND_MOVIES_RATE)
+@query_budget(2)
+def find_movies(request, name="", saved=False, fields: str = None):
+    """
+    Search movies, `fields` (e.g. "title,cover_url") limits the returned fields
+    """
     try:
+        selected_fields = parse_fields(fields, MovieSchema)
         if saved:
             user_id = request.auth["user_id"]
-            user = User.objects.get(pk=user_id)
-            movies_id = list(
-                SavedMovie.objects.filter(user=user).values_list("movie_id", flat=True)
+            # a subquery instead of a join, so a movie saved twice is listed once
+            movies = Movie.objects.filter(
+                pk__in=SavedMovie.objects.filter(user_id=user_id).values("movie_id")
             )
-            movies = Movie.objects.filter(pk__in=movies_id)
             if name:
                 movies = movies.filter(title__icontains=name)
 
-            return [MovieSchema(**m.__dict__) for m in movies]
+            return list(movies.values(*selected_fields))
 
         if not name:
             return []
 
-        movies = Movie.objects.filter(title__icontains=name)
+        movies = Movie.objects.filter(title__icontains=name).values(*selected_fields)
         if movies:
-            return [MovieSchema(**m.__dict__) for m in movies]
+            return list(movies)
 
-        imdb_api = IMDb()
+        consume(request, FIND_MOVIES_RATE, scope="find_movies", cost=IMDB_SEARCH_COST)
+        imdb_api = get_imdb_client()
         movies = imdb_api.search_movie(name)
         movies_dict = []
+        db_movies = []
         for m in movies:
             try:
                 movie_schema = MovieSchema(
@@ -190,13 +231,17 @@ def find_movies(request, name="", saved=False):
                     # we only support movie
                     continue
 
-                movies_dict.append(movie_schema)
-                db_movie = Movie(**movie_schema.dict())
-                db_movie.save()
+                movies_dict.append(movie_schema.dict(include=set(selected_fields)))
+                db_movies.append(Movie(**movie_schema.dict()))
             except KeyError:
                 continue
 
+        Movie.objects.bulk_create(db_movies, ignore_conflicts=True)
         return movies_dict
+    except InvalidFieldsException as err:
+        return 400, MessageResponseSchema(message=str(err))
+    except RateLimitExceeded:
+        raise
     except Exception:
         return 400, MessageResponseSchema(
             message="We had a problem, it's not was possible to find the movie"
@@ -205,16 +250,34 @@ def find_movies(request, name="", saved=False):
 
 @api.get(
     "/movies/{imdb_id}",
-    response={200: MovieDetailsSchema, frozenset({400, 404}): MessageResponseSchema},
+    response={
+        200: SparseMovieDetailsSchema,
+        frozenset({400, 404}): MessageResponseSchema,
+    },
+    exclude_unset=True,
     tags=["Movies"],
 )
-def get_movie(request, imdb_id: str):
+@rate_limit("60/m", cost=2)
+@query_budget(2)
+def get_movie(request, imdb_id: str, fields: str = None):
+    """
+    Get movie details, `fields` (e.g. "title,rating") limits the returned fields
+    """
     try:
-        db_movie = get_movie_detailed(imdb_id, verify_detailed=True)
+        selected_fields = parse_fields(fields, MovieDetailsSchema)
+        cached_movie = get_cached_movie_details(imdb_id)
+        if cached_movie:
+            return {f: cached_movie[f] for f in selected_fields}
+
+        db_movie = get_movie_detailed(
+            imdb_id, verify_detailed=True, only=selected_fields
+        )
         if db_movie:
-            return MovieDetailsSchema(**db_movie.__dict__)
+            return {f: getattr(db_movie, f) for f in selected_fields}
 
         return 404, MessageResponseSchema(message="Movie not found")
+    except InvalidFieldsException as err:
+        return 400, MessageResponseSchema(message=str(err))
     except OnlySupportMovieException:
         return 400, MessageResponseSchema(message="We only support movies")
     except Exception as err:
@@ -229,18 +292,18 @@ def get_movie(request, imdb_id: str):
     response={frozenset({200, 400, 404}): MessageResponseSchema},
     tags=["Movies"],
 )
+@query_budget(3)
 def save_movie(request, imdb_id: str):
     """
     Add movie to your saved movies list
     """
     try:
         user_id = request.auth["user_id"]
-        user = User.objects.get(pk=user_id)
         movie = get_movie_detailed(imdb_id)
         if not movie:
             return 404, MessageResponseSchema(message="Movie not found")
 
-        saved_movie = SavedMovie(user=user, movie=movie)
+        saved_movie = SavedMovie(user_id=user_id, movie=movie)
         saved_movie.save()
 
         return MessageResponseSchema(message="Movie saved to your list")
@@ -249,6 +312,7 @@ def save_movie(request, imdb_id: str):
     except Exception:
         return 400, MessageResponseSchema(
             message="We had a problem, it's not was possible to get the movie"
+        )
 
 
 @api.post(
@@ -256,18 +320,18 @@ def save_movie(request, imdb_id: str):
     response={frozenset({200, 400, 404}): MessageResponseSchema},
     tags=["Movies"],
 )
+@query_budget(4)
 def save_movie(request, imdb_id: str):
     """
     Remove a movie from your saved movies list
     """
     try:
         user_id = request.auth["user_id"]
-        user = User.objects.get(pk=user_id)
         movie = get_movie_detailed(imdb_id)
         if not movie:
             return 404, MessageResponseSchema(message="Movie not found")
 
-        saved_movie = SavedMovie.objects.get(user=user, movie=movie)
+        saved_movie = SavedMovie.objects.get(user_id=user_id, movie=movie)
         saved_movie.delete()
 
         return MessageResponseSchema(message="Movie saved to your list")
@@ -276,3 +340,4 @@ def save_movie(request, imdb_id: str):
     except Exception:
         return 400, MessageResponseSchema(
             message="We had a problem, it's not was possible to get the movie"
+        )
@@ -0,0 +1,221 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import urllib.request
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Set, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, covers are served at full size without it
+    Image = None
+
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": ("image/jpeg", "jpg"),
+    b"\x89PNG\r\n\x1a\n": ("image/png", "png"),
+    b"GIF87a": ("image/gif", "gif"),
+    b"GIF89a": ("image/gif", "gif"),
+}
+EXTENSION_CONTENT_TYPES = {
+    extension: content_type for content_type, extension in IMAGE_SIGNATURES.values()
+}
+EXTENSION_CONTENT_TYPES["webp"] = "image/webp"
+
+
+class CoverException(Exception):
+    pass
+
+
+class CoverFetchException(CoverException):
+    pass
+
+
+def guess_image_extension(content: bytes) -> str:
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "webp"
+
+    for signature, (_, extension) in IMAGE_SIGNATURES.items():
+        if content.startswith(signature):
+            return extension
+
+    raise CoverFetchException("Upstream content is not a supported image")
+
+
+class UrlFetcher:
+    """
+    Default upstream fetcher, any object with a `fetch(url) -> bytes` method
+    can be configured with COVER_FETCHER, e.g. to test against a local server
+    """
+
+    def __init__(self, timeout: float = 10, max_size: int = 10 * 1024 * 1024):
+        self.timeout = timeout
+        self.max_size = max_size
+
+    def fetch(self, url: str) -> bytes:
+        if not url.startswith(("http://", "https://")):
+            raise CoverFetchException(f"Unsupported cover url: {url}")
+
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                content = response.read(self.max_size + 1)
+        except OSError as err:
+            raise CoverFetchException(f"Could not fetch {url}: {err}") from err
+
+        if len(content) > self.max_size:
+            raise CoverFetchException(f"Cover {url} is bigger than {self.max_size}")
+
+        return content
+
+
+class CoverCache:
+    """
+    Content-addressed cover cache: originals are stored by the sha256 of their
+    content, thumbnails next to them by width, and `urls/` maps the upstream
+    url to the original. Files used by a request are touched and the least
+    recently used ones are evicted once the cache grows past `max_size` bytes.
+    """
+
+    def __init__(self, root: Path, fetcher, max_size: int):
+        self.root = Path(root)
+        self.fetcher = fetcher
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    def get(self, url: str, width: Optional[int] = None) -> Tuple[Path, str]:
+        """
+        Return the path of the cover for `url`, resized to `width` when given,
+        and its ETag. Errors other than the upstream ones (disk, decoding)
+        are raised as CoverException.
+        """
+        try:
+            url_key, original, written = self._get_original(url)
+            digest, extension = original.name.split(".")
+            if not width or Image is None:
+                if written:
+                    self.evict(keep={url_key, original})
+                return original, digest
+
+            thumbnail = original.with_name(f"{digest}-w{width}.{extension}")
+            if not self._touch(thumbnail):
+                self._write(thumbnail, self._resize(original.read_bytes(), width))
+                written = True
+
+            if written:
+                self.evict(keep={url_key, original, thumbnail})
+            return thumbnail, f"{digest}-w{width}"
+        except OSError as err:
+            raise CoverException(f"Cover cache error: {err}") from err
+
+    def _get_original(self, url: str) -> Tuple[Path, Path, bool]:
+        """
+        Return the url index and original paths, and whether they were written
+        """
+        url_key = self.root / "urls" / hashlib.sha256(url.encode()).hexdigest()
+        if self._touch(url_key):
+            try:
+                original = self.root / url_key.read_text()
+            except FileNotFoundError:
+                original = None
+            if original and self._touch(original):
+                return url_key, original, False
+
+        content = self.fetcher.fetch(url)
+        digest = hashlib.sha256(content).hexdigest()
+        extension = guess_image_extension(content)
+        original = self.root / digest[:2] / f"{digest}.{extension}"
+        if not self._touch(original):
+            self._write(original, content)
+        self._write(url_key, str(original.relative_to(self.root)).encode())
+
+        return url_key, original, True
+
+    def _resize(self, content: bytes, width: int) -> bytes:
+        try:
+            image = Image.open(io.BytesIO(content))
+            image_format = image.format
+            if image.width > width:
+                height = round(image.height * width / image.width)
+                image = image.resize((width, height), Image.LANCZOS)
+
+            output = io.BytesIO()
+            image.save(output, format=image_format)
+        except (OSError, ValueError, Image.DecompressionBombError) as err:
+            raise CoverException(f"Could not resize the cover: {err}") from err
+
+        return output.getvalue()
+
+    def _touch(self, path: Path) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _write(self, path: Path, content: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp")
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(content)
+        os.replace(tmp_path, path)
+
+    def evict(self, keep: Set[Path] = frozenset()):
+        """
+        Remove the least recently used files until the cache fits in
+        `max_size`, the files in `keep` (used by the current request) are
+        never removed even if they alone are bigger
+        """
+        with self._lock:
+            files = []
+            for path in self.root.glob("*/*"):
+                if path.name.startswith(".tmp") or path in keep:
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+            total_size = sum(size for _, size, _ in files)
+            for path in keep:
+                try:
+                    total_size += path.stat().st_size
+                except FileNotFoundError:
+                    continue
+
+            for _, size, path in sorted(files):
+                if total_size <= self.max_size:
+                    break
+
+                path.unlink(missing_ok=True)
+                total_size -= size
+
+
+def normalize_width(width: Optional[int]) -> Optional[int]:
+    """
+    Round the requested width up to one of COVER_WIDTHS, so a bounded number
+    of thumbnails is generated for each cover
+    """
+    if not width:
+        return None
+
+    widths = sorted(getattr(settings, "COVER_WIDTHS", (100, 200, 400, 800)))
+    return next((w for w in widths if w >= width), widths[-1])
+
+
+@lru_cache(maxsize=None)
+def get_cover_cache() -> CoverCache:
+    fetcher = import_string(
+        getattr(settings, "COVER_FETCHER", "core.covers.UrlFetcher")
+    )
+    return CoverCache(
+        root=getattr(settings, "COVER_CACHE_DIR", settings.BASE_DIR / "cover_cache"),
+        fetcher=fetcher(),
+        max_size=getattr(settings, "COVER_CACHE_MAX_SIZE", 512 * 1024 * 1024),
+    )
@@ -0,0 +1,109 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# runs in a fresh interpreter like the gunicorn master with `preload_app`,
+# then forks the workers
+MASTER_CODE = """
+import json, os, sys, time
+
+def rss_mb():
+    # current resident set size, includes the pages shared with the master
+    with open("/proc/self/statm") as statm:
+        pages = int(statm.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+start = time.perf_counter()
+from favorite_movies.wsgi import application
+import_time = time.perf_counter() - start
+
+from core.warmup import warmup_app, warmup_worker
+start = time.perf_counter()
+warmup_app()
+warmup_app_time = time.perf_counter() - start
+
+workers = []
+for _ in range(int(sys.argv[1])):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        start = time.perf_counter()
+        warmup_worker()
+        result = {"warmup_time": time.perf_counter() - start, "rss": rss_mb()}
+        os.write(write_fd, json.dumps(result).encode())
+        os._exit(0)
+
+    os.close(write_fd)
+    workers.append((pid, read_fd))
+
+results = []
+for pid, read_fd in workers:
+    with os.fdopen(read_fd) as worker_output:
+        results.append(json.loads(worker_output.read()))
+    os.waitpid(pid, 0)
+
+print(json.dumps({
+    "import_time": import_time,
+    "warmup_app_time": warmup_app_time,
+    "master_rss": rss_mb(),
+    "worker_warmup_time": [r["warmup_time"] for r in results],
+    "worker_rss": [r["rss"] for r in results],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the import and warmup time and the current RSS of a preloaded "
+        "master and its forked workers (Linux only, reads /proc)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--workers", type=int, default=2)
+
+    def handle(self, *args, **options):
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": os.environ.get(
+                "DJANGO_SETTINGS_MODULE", "favorite_movies.settings"
+            ),
+        }
+        results = []
+        for _ in range(options["runs"]):
+            try:
+                output = subprocess.run(
+                    [sys.executable, "-c", MASTER_CODE, str(options["workers"])],
+                    env=env,
+                    cwd=settings.BASE_DIR,
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+            except subprocess.CalledProcessError as err:
+                raise CommandError(f"Benchmark process failed:\n{err.stderr}")
+
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+        for key, unit in (
+            ("import_time", "s"),
+            ("warmup_app_time", "s"),
+            ("master_rss", "MB"),
+            ("worker_warmup_time", "s"),
+            ("worker_rss", "MB"),
+        ):
+            values = []
+            for result in results:
+                value = result[key]
+                values.extend(value if isinstance(value, list) else [value])
+
+            self.stdout.write(
+                f"{key}: median {statistics.median(values):.3f}{unit} "
+                f"min {min(values):.3f}{unit} max {max(values):.3f}{unit}"
+            )
@@ -0,0 +1,85 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, only gzip is used without it
+    brotli = None
+
+
+def _compress_gzip(content: bytes, level: int) -> bytes:
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def _compress_brotli(content: bytes, level: int) -> bytes:
+    return brotli.compress(content, quality=level)
+
+
+COMPRESSORS = {"br": _compress_brotli, "gzip": _compress_gzip}
+DEFAULT_LEVELS = {"br": 4, "gzip": 6}
+
+
+class CompressionMiddleware:
+    """
+    Compress responses bigger than COMPRESSION_MIN_SIZE with the first
+    algorithm of COMPRESSION_ALGORITHMS accepted by the client.
+    Unlike django's GZipMiddleware the threshold and the algorithms are
+    configurable, and brotli is used when the `brotli` package is installed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+        self.content_types = getattr(
+            settings, "COMPRESSION_CONTENT_TYPES", ("application/json", "text/")
+        )
+        self.levels = getattr(settings, "COMPRESSION_LEVELS", DEFAULT_LEVELS)
+        self.algorithms = [
+            algorithm
+            for algorithm in getattr(settings, "COMPRESSION_ALGORITHMS", ("br", "gzip"))
+            if algorithm in COMPRESSORS and (algorithm != "br" or brotli)
+        ]
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < self.min_size
+            or not response.get("Content-Type", "").startswith(self.content_types)
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        algorithm = self.choose_algorithm(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if not algorithm:
+            return response
+
+        compressed = COMPRESSORS[algorithm](
+            response.content, self.levels.get(algorithm, DEFAULT_LEVELS[algorithm])
+        )
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = algorithm
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            # the representation changed, the strong ETag is no longer valid
+            response["ETag"] = "W/" + etag
+
+        return response
+
+    def choose_algorithm(self, accept_encoding: str):
+        for algorithm in self.algorithms:
+            rejected = rf"\b{algorithm}\b\s*;\s*q=0(\.0*)?(?![\d.])"
+            if re.search(rf"\b{algorithm}\b", accept_encoding) and not re.search(
+                rejected, accept_encoding
+            ):
+                return algorithm
+
+        return None
@@ -0,0 +1,117 @@
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import wraps
+from typing import List, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+class QueryCounter:
+    """
+    `connection.execute_wrapper` callable recording every executed SQL,
+    transaction control statements aren't counted as queries
+    """
+
+    def __init__(self):
+        self.queries: List[Tuple[str, float]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            return execute(sql, params, many, context)
+
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.monotonic() - start))
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def duplicates(self, threshold: int) -> List[Tuple[str, int]]:
+        """
+        SQL statements executed at least `threshold` times with only their
+        params changing, the usual sign of an N+1 query
+        """
+        counts = Counter(sql for sql, _ in self.queries)
+        return [(sql, n) for sql, n in counts.most_common() if n >= threshold]
+
+
+def query_budget(max_queries: int):
+    """
+    Declare the maximum number of queries a NinjaAPI operation may run,
+    enforced by QueryBudgetMiddleware. Apply it below the router decorator.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            request.query_budget = max_queries
+            return view_func(request, *args, **kwargs)
+
+        wrapper.query_budget = max_queries
+        return wrapper
+
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the queries of each request (debug/test only), flag repeated SQL as
+    N+1 and check the route budget declared with `query_budget`.
+    With QUERY_BUDGET_ACTION = "raise" violations raise QueryBudgetExceeded,
+    which makes the django test client fail, otherwise they are logged.
+    The count is exposed in the `X-Query-Count` header and in the
+    `queries` attribute of the test client response.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "QUERY_BUDGET_ENABLED", settings.DEBUG)
+        self.action = getattr(settings, "QUERY_BUDGET_ACTION", "log")
+        self.duplicate_threshold = getattr(
+            settings, "QUERY_BUDGET_DUPLICATE_THRESHOLD", 3
+        )
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        response["X-Query-Count"] = str(counter.count)
+        response.queries = counter.queries
+
+        problems = []
+        budget = getattr(request, "query_budget", None)
+        if budget is not None and counter.count > budget:
+            problems.append(
+                f"{counter.count} queries exceed the budget of {budget} queries"
+            )
+        for sql, times in counter.duplicates(self.duplicate_threshold):
+            problems.append(f"possible N+1, executed {times} times: {sql}")
+
+        if problems:
+            message = f"{request.method} {request.path}: " + "; ".join(problems)
+            if self.action == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
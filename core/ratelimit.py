@@ -0,0 +1,232 @@
+import math
+import threading
+import time
+import uuid
+from functools import lru_cache, wraps
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+RATE_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """
+    Parse a rate like "10/m" into (capacity, tokens refilled per second)
+    """
+    amount, period = rate.split("/")
+    capacity = int(amount)
+    return capacity, capacity / RATE_PERIODS[period.strip().lower()[0]]
+
+
+class TokenBucket:
+    def __init__(self, capacity: int, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+
+    def consume(
+        self, state: Optional[Tuple[float, float]], cost: int, now: float
+    ) -> Tuple[Tuple[float, float], float]:
+        """
+        Return the new (tokens, timestamp) state and the seconds to wait
+        before the request is allowed (0 when allowed)
+        """
+        tokens, last = state if state else (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - last) * self.refill_rate)
+        if tokens >= cost:
+            return (tokens - cost, now), 0
+
+        return (tokens, now), (cost - tokens) / self.refill_rate
+
+    def time_to_full(self, state: Tuple[float, float]) -> float:
+        tokens, _ = state
+        return (self.capacity - tokens) / self.refill_rate
+
+
+class InMemoryBackend:
+    """
+    Per-process buckets, only meaningful with a single worker or for tests.
+    Buckets that are full again are dropped every `prune_interval` seconds,
+    so memory doesn't grow with every client seen.
+    """
+
+    prune_interval = 60
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.time()
+
+    def consume(self, key: str, bucket: TokenBucket, cost: int) -> float:
+        with self._lock:
+            now = time.time()
+            if now - self._last_prune >= self.prune_interval:
+                self._prune(now)
+
+            state, _ = self._buckets.get(key, (None, None))
+            state, wait = bucket.consume(state, cost, now)
+            self._buckets[key] = (state, now + bucket.time_to_full(state))
+            return wait
+
+    def _prune(self, now: float):
+        self._buckets = {
+            key: (state, full_at)
+            for key, (state, full_at) in self._buckets.items()
+            if full_at > now
+        }
+        self._last_prune = now
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBackend:
+    """
+    Buckets stored in a Django cache, shared between workers using the same
+    cache (e.g. Redis or Memcached). Updates of a bucket are serialized with
+    a lock entry created by the atomic `cache.add`, requests that can't get
+    it within `lock_wait` seconds are limited.
+    """
+
+    lock_timeout = 1
+    lock_wait = 0.5
+    lock_poll_interval = 0.005
+
+    def __init__(self, alias: str = "default"):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def consume(self, key: str, bucket: TokenBucket, cost: int) -> float:
+        cache_key = f"ratelimit:{key}"
+        lock_key = f"{cache_key}:lock"
+        lock_token = uuid.uuid4().hex
+        cache = self.cache
+
+        deadline = time.monotonic() + self.lock_wait
+        while not cache.add(lock_key, lock_token, self.lock_timeout):
+            if time.monotonic() >= deadline:
+                return self.lock_wait
+            time.sleep(self.lock_poll_interval)
+
+        try:
+            state, wait = bucket.consume(cache.get(cache_key), cost, time.time())
+            # keep the entry until the bucket would be full again
+            cache.set(cache_key, state, math.ceil(bucket.time_to_full(state)) + 1)
+            return wait
+        finally:
+            # the lock may have expired and been taken by another request
+            if cache.get(lock_key) == lock_token:
+                cache.delete(lock_key)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    if getattr(settings, "RATELIMIT_BACKEND", "memory") == "cache":
+        return CacheBackend(getattr(settings, "RATELIMIT_CACHE_ALIAS", "default"))
+
+    return InMemoryBackend()
+
+
+def get_client_ip(request) -> str:
+    """
+    Behind RATELIMIT_PROXY_COUNT proxies that append to X-Forwarded-For the
+    client IP is the entry added by the outermost one, counting from the
+    right. The entries on its left are sent by the client and can't be trusted.
+    """
+    proxy_count = getattr(settings, "RATELIMIT_PROXY_COUNT", 0)
+    forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if proxy_count and forwarded_for:
+        entries = [entry.strip() for entry in forwarded_for.split(",")]
+        return entries[max(len(entries) - proxy_count, 0)]
+
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def user_or_ip_key(request) -> str:
+    """
+    Authenticated requests are limited by user id (from AuthBearer),
+    anonymous ones by client IP
+    """
+    auth = getattr(request, "auth", None)
+    if isinstance(auth, dict) and auth.get("user_id") is not None:
+        return f"user:{auth['user_id']}"
+
+    return f"ip:{get_client_ip(request)}"
+
+
+def ip_key(request) -> str:
+    return f"ip:{get_client_ip(request)}"
+
+
+@lru_cache(maxsize=None)
+def get_bucket(rate: str) -> TokenBucket:
+    return TokenBucket(*parse_rate(rate))
+
+
+def consume(
+    request,
+    rate: str,
+    *,
+    scope: str,
+    cost: int = 1,
+    key: Callable = user_or_ip_key,
+):
+    """
+    Consume `cost` tokens from the `scope` bucket of the client, raising
+    RateLimitExceeded when there aren't enough. Operations call it directly
+    to charge extra tokens only on their costly path:
+
+        consume(request, "60/m", scope="find_movies", cost=4)
+    """
+    if not getattr(settings, "RATELIMIT_ENABLED", True):
+        return
+
+    wait = get_backend().consume(f"{scope}:{key(request)}", get_bucket(rate), cost)
+    if wait:
+        raise RateLimitExceeded(math.ceil(wait))
+
+
+def rate_limit(
+    rate: str,
+    *,
+    cost: int = 1,
+    key: Callable = user_or_ip_key,
+    scope: Optional[str] = None,
+):
+    """
+    Limit a NinjaAPI operation with a token bucket of `rate` (e.g. "10/m").
+    Costly operations can consume more than one token per call. The bucket
+    is named after the operation unless `scope` is given.
+
+    Must be applied below the router decorator so `request.auth` is set:
+
+        @api.get("/movies/{imdb_id}")
+        @rate_limit("60/m", cost=2)
+        def get_movie(request, imdb_id: str): ...
+    """
+    capacity, _ = parse_rate(rate)
+    if cost > capacity:
+        raise ValueError(f"cost {cost} is greater than the bucket capacity {capacity}")
+
+    def decorator(view_func):
+        bucket_scope = scope or view_func.__name__
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            consume(request, rate, scope=bucket_scope, cost=cost, key=key)
+            return view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
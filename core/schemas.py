@@ -1,13 +1,15 @@
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
 from django.contrib.auth.hashers import make_password
 from pydantic import Field
 from ninja import Schema
 from ninja.orm import create_schema
-from imdb import Movie
 
 from .models import User
 
+if TYPE_CHECKING:
+    from imdb import Movie
+
 BaseCreateUserSchema = create_schema(User, exclude=["id"])
 PublicUserSchema = create_schema(User, fields=["name", "email"])
 UserSchema = create_schema(User, exclude=["id", "password", "recovery_answer"])
@@ -48,7 +50,7 @@ class MovieDetailsSchema(MovieSchema):
     directors: List[str]
     synopsis: str
 
-    def from_api_movie(cls, api_movie: Movie) -> "MovieDetailsSchema":
+    def from_api_movie(cls, api_movie: "Movie") -> "MovieDetailsSchema":
         return MovieDetailsSchema(
             title=api_movie["title"],
             kind=api_movie["kind"],
@@ -62,6 +64,26 @@ class MovieDetailsSchema(MovieSchema):
         )
 
 
+class SparseMovieSchema(Schema):
+    """
+    MovieSchema with every field optional, used with `exclude_unset` to
+    serialize only the fields requested through `fields=`
+    """
+
+    title: Optional[str]
+    kind: Optional[str]
+    year: Optional[int]
+    cover_url: Optional[str]
+    imdb_id: Optional[str]
+
+
+class SparseMovieDetailsSchema(SparseMovieSchema):
+    rating: Optional[float]
+    genres: Optional[List[str]]
+    directors: Optional[List[str]]
+    synopsis: Optional[str]
+
+
 class UpdateUserRequestSchema(Schema):
     name: Optional[str]
     email: Optional[str]
@@ -1,11 +1,15 @@
-from typing import Optional
+from functools import lru_cache
+from typing import List, Optional, Type
 
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from imdb import IMDb
+from ninja import Schema
 
 from .models import Movie
 from .schemas import MovieDetailsSchema
 
+MOVIE_DETAILS_CACHE_KEY = "movie-details:{}"
+
 
 class MovieNotDetailedException(Exception):
     pass
@@ -15,15 +19,74 @@ class OnlySupportMovieException(Exception):
     pass
 
 
-def get_movie_detailed(imdb_id: str, *, verify_detailed=False) -> Optional[Movie]:
+class InvalidFieldsException(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def get_imdb_client():
+    """
+    Per-process IMDb client, IMDbPY is imported on first use since it is
+    heavy and most requests are answered from the database
+    """
+    from imdb import IMDb
+
+    return IMDb()
+
+
+def cache_movie_details(movie: Movie):
+    cache.set(
+        MOVIE_DETAILS_CACHE_KEY.format(movie.imdb_id),
+        MovieDetailsSchema(**movie.__dict__).dict(),
+        None,
+    )
+
+
+def get_cached_movie_details(imdb_id: str) -> Optional[dict]:
+    """
+    Details of the hot titles cached by the worker warmup
+    """
+    return cache.get(MOVIE_DETAILS_CACHE_KEY.format(imdb_id))
+
+
+def parse_fields(fields: Optional[str], schema: Type[Schema]) -> List[str]:
+    """
+    Parse a comma separated `fields=` query param, returning all the schema
+    fields when it is empty
+    """
+    available = list(schema.__fields__)
+    selected = list(
+        dict.fromkeys(f.strip() for f in (fields or "").split(",") if f.strip())
+    )
+    if not selected:
+        return available
+
+    invalid = [f for f in selected if f not in available]
+    if invalid:
+        raise InvalidFieldsException(
+            f"Invalid fields: {', '.join(invalid)}. Available: {', '.join(available)}"
+        )
+
+    return selected
+
+
+def get_movie_detailed(
+    imdb_id: str, *, verify_detailed=False, only: Optional[List[str]] = None
+) -> Optional[Movie]:
     movie = None
     try:
-        movie = Movie.objects.get(imdb_id=imdb_id)
+        movies = Movie.objects.all()
+        if only:
+            movies = (
+                movies.only(*only, "rating") if verify_detailed else movies.only(*only)
+            )
+
+        movie = movies.get(imdb_id=imdb_id)
         if verify_detailed and not movie.rating:
             raise MovieNotDetailedException
 
     except (ObjectDoesNotExist, MovieNotDetailedException):
-        imdb_api = IMDb()
+        imdb_api = get_imdb_client()
         api_movie = imdb_api.get_movie(imdb_id)
         if not api_movie:
             return None
@@ -1 +1,765 @@
-from django.test import TestCase, Client
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import TestCase, Client, RequestFactory, override_settings
+
+from .covers import (
+    CoverCache,
+    CoverException,
+    CoverFetchException,
+    Image,
+    UrlFetcher,
+    get_cover_cache,
+)
+from .middleware import CompressionMiddleware, brotli
+from .models import Movie, SavedMovie, User
+from .querybudget import QueryBudgetExceeded, QueryBudgetMiddleware
+from .services import get_cached_movie_details
+from .warmup import warm_hot_titles, warmup_worker
+from .ratelimit import (
+    CacheBackend,
+    InMemoryBackend,
+    TokenBucket,
+    get_backend,
+    get_client_ip,
+    parse_rate,
+    user_or_ip_key,
+)
+
+
+# routes over their query budget make the tests fail
+@override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_ACTION="raise")
+class ApiTestCase(TestCase):
+    def setUp(self):
+        get_backend().clear()
+        cache.clear()
+        self.client = Client()
+
+    def create_user(self, email="user@example.com", password="password123"):
+        return User.objects.create(
+            name="User",
+            email=email,
+            password=make_password(password),
+            recovery_question="Question?",
+            recovery_answer="Answer",
+        )
+
+    def create_movie(self, **fields):
+        return Movie.objects.create(
+            **{
+                "imdb_id": "0133093",
+                "title": "The Matrix",
+                "kind": "movie",
+                "year": 1999,
+                "cover_url": "https://example.com/matrix.jpg",
+                "rating": 8.7,
+                "genres": ["Action", "Sci-Fi"],
+                "directors": ["Lana Wachowski", "Lilly Wachowski"],
+                "synopsis": "A hacker learns the truth.",
+                **fields,
+            }
+        )
+
+    def auth_headers(self, user):
+        response = self.client.post(
+            "/v1/auth/generate-token",
+            {"email": user.email, "password": "password123"},
+            content_type="application/json",
+        )
+        get_backend().clear()
+        return {"HTTP_AUTHORIZATION": f"Bearer {response.json()['token']}"}
+
+
+class TokenBucketTest(TestCase):
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/m"), (10, 10 / 60))
+        self.assertEqual(parse_rate("5/second"), (5, 5))
+
+    def test_consume_until_empty_and_refill(self):
+        bucket = TokenBucket(capacity=2, refill_rate=1)
+
+        state, wait = bucket.consume(None, 1, now=0)
+        self.assertEqual((state, wait), ((1, 0), 0))
+        state, wait = bucket.consume(state, 1, now=0)
+        self.assertEqual((state, wait), ((0, 0), 0))
+        state, wait = bucket.consume(state, 1, now=0.25)
+        self.assertEqual(wait, 0.75)
+        state, wait = bucket.consume(state, 1, now=1)
+        self.assertEqual(wait, 0)
+
+    def test_refill_is_capped_at_capacity(self):
+        bucket = TokenBucket(capacity=2, refill_rate=1)
+        state, _ = bucket.consume((0, 0), 1, now=100)
+        self.assertEqual(state, (1, 100))
+
+    def test_cost_greater_than_one(self):
+        bucket = TokenBucket(capacity=10, refill_rate=1)
+        state, wait = bucket.consume(None, 6, now=0)
+        self.assertEqual((state, wait), ((4, 0), 0))
+        _, wait = bucket.consume(state, 6, now=0)
+        self.assertEqual(wait, 2)
+
+
+class RateLimitBackendTest(TestCase):
+    def tearDown(self):
+        caches["default"].clear()
+
+    def test_in_memory_backend_prunes_full_buckets(self):
+        bucket = TokenBucket(capacity=1, refill_rate=1)
+        with mock.patch("core.ratelimit.time.time", return_value=1000):
+            backend = InMemoryBackend()
+            backend.consume("a", bucket, 1)
+            backend.consume("b", bucket, 1)
+        self.assertEqual(len(backend._buckets), 2)
+
+        with mock.patch("core.ratelimit.time.time", return_value=1000 + 60):
+            backend.consume("c", bucket, 1)
+        self.assertEqual(list(backend._buckets), ["c"])
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_cache_backend_shares_buckets(self):
+        bucket = TokenBucket(capacity=2, refill_rate=0.1)
+        self.assertEqual(CacheBackend().consume("key", bucket, 1), 0)
+        self.assertEqual(CacheBackend().consume("key", bucket, 1), 0)
+        self.assertGreater(CacheBackend().consume("key", bucket, 1), 0)
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_cache_backend_limits_when_lock_is_held(self):
+        backend = CacheBackend()
+        backend.lock_wait = 0.01
+        caches["default"].add("ratelimit:key:lock", "other", 10)
+
+        wait = backend.consume("key", TokenBucket(capacity=2, refill_rate=1), 1)
+
+        self.assertEqual(wait, 0.01)
+        self.assertIsNone(caches["default"].get("ratelimit:key"))
+
+
+class RateLimitKeyTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_user_key(self):
+        request = self.factory.get("/")
+        request.auth = {"user_id": 7}
+        self.assertEqual(user_or_ip_key(request), "user:7")
+
+    def test_ip_key_for_anonymous_requests(self):
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.1")
+        request.auth = None
+        self.assertEqual(user_or_ip_key(request), "ip:10.0.0.1")
+
+    @override_settings(RATELIMIT_PROXY_COUNT=1)
+    def test_client_ip_is_the_entry_added_by_the_proxy(self):
+        request = self.factory.get(
+            "/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="1.1.1.1, 2.2.2.2"
+        )
+        self.assertEqual(get_client_ip(request), "2.2.2.2")
+
+    @override_settings(RATELIMIT_PROXY_COUNT=0)
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        request = self.factory.get(
+            "/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="1.1.1.1"
+        )
+        self.assertEqual(get_client_ip(request), "10.0.0.1")
+
+
+@override_settings(RATELIMIT_PROXY_COUNT=1)
+class RateLimitApiTest(ApiTestCase):
+    def generate_token(self, ip):
+        return self.client.post(
+            "/v1/auth/generate-token",
+            {"email": "nobody@example.com", "password": "password123"},
+            content_type="application/json",
+            HTTP_X_FORWARDED_FOR=ip,
+        )
+
+    def test_too_many_requests(self):
+        for _ in range(10):
+            self.assertEqual(self.generate_token("1.1.1.1").status_code, 404)
+
+        response = self.generate_token("1.1.1.1")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json(), {"message": "Too many requests"})
+        self.assertEqual(response["Retry-After"], "6")
+        # other clients have their own bucket
+        self.assertEqual(self.generate_token("2.2.2.2").status_code, 404)
+
+    def search_movies(self, headers, name="alien"):
+        return self.client.get("/v1/movies", {"name": name}, **headers)
+
+    @mock.patch("core.api.get_imdb_client")
+    def test_imdb_searches_consume_more_tokens(self, get_imdb_client):
+        get_imdb_client.return_value.search_movie.return_value = []
+        headers = self.auth_headers(self.create_user())
+        # 60/m with 1 + 4 tokens per IMDb search allows 12 searches
+        for _ in range(12):
+            self.assertEqual(self.search_movies(headers).status_code, 200)
+
+        response = self.search_movies(headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(get_imdb_client.return_value.search_movie.call_count, 12)
+
+    def test_database_searches_consume_one_token(self):
+        self.create_movie()
+        headers = self.auth_headers(self.create_user())
+        for _ in range(60):
+            self.assertEqual(self.search_movies(headers, "matrix").status_code, 200)
+
+        self.assertEqual(self.search_movies(headers, "matrix").status_code, 429)
+
+    @mock.patch("core.api.get_imdb_client")
+    def test_users_are_limited_separately(self, get_imdb_client):
+        get_imdb_client.return_value.search_movie.return_value = []
+        first = self.auth_headers(self.create_user())
+        second = self.auth_headers(self.create_user(email="other@example.com"))
+        for _ in range(12):
+            self.search_movies(first)
+
+        self.assertEqual(self.search_movies(first).status_code, 429)
+        self.assertEqual(self.search_movies(second).status_code, 200)
+
+
+class CompressionMiddlewareTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.content = json.dumps([{"title": "The Matrix"}] * 100)
+
+    def get_response(self, accept_encoding="", content=None, **kwargs):
+        response = HttpResponse(
+            self.content if content is None else content,
+            content_type=kwargs.pop("content_type", "application/json"),
+            **kwargs,
+        )
+        middleware = CompressionMiddleware(lambda request: response)
+        request = self.factory.get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return middleware(request)
+
+    @override_settings(COMPRESSION_ALGORITHMS=["gzip"])
+    def test_gzip(self):
+        response = self.get_response("gzip, deflate")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertEqual(gzip.decompress(response.content).decode(), self.content)
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli_is_preferred(self):
+        response = self.get_response("gzip, br")
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content).decode(), self.content)
+
+    def test_rejected_encoding(self):
+        response = self.get_response("gzip;q=0, br;q=0")
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    @override_settings(COMPRESSION_MIN_SIZE=1024)
+    def test_responses_below_threshold_are_not_compressed(self):
+        response = self.get_response("gzip, br", content="x" * 1023)
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response.content, b"x" * 1023)
+
+    def test_other_content_types_are_not_compressed(self):
+        response = self.get_response("gzip, br", content_type="image/png")
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    @override_settings(COMPRESSION_ALGORITHMS=["gzip"])
+    def test_strong_etag_is_weakened(self):
+        response = self.get_response("gzip", headers={"ETag": '"abc"'})
+
+        self.assertEqual(response["ETag"], 'W/"abc"')
+
+
+class MovieFieldsTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.headers = self.auth_headers(self.user)
+        self.movie = self.create_movie()
+
+    def test_find_movies_with_fields(self):
+        response = self.client.get(
+            "/v1/movies",
+            {"name": "matrix", "fields": "title,cover_url"},
+            **self.headers,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [{"title": "The Matrix", "cover_url": "https://example.com/matrix.jpg"}],
+        )
+
+    def test_find_movies_without_fields(self):
+        response = self.client.get("/v1/movies", {"name": "matrix"}, **self.headers)
+
+        self.assertEqual(
+            response.json(),
+            [
+                {
+                    "title": "The Matrix",
+                    "kind": "movie",
+                    "year": 1999,
+                    "cover_url": "https://example.com/matrix.jpg",
+                    "imdb_id": "0133093",
+                }
+            ],
+        )
+
+    def test_find_saved_movies_with_fields(self):
+        SavedMovie.objects.create(user=self.user, movie=self.movie)
+        Movie.objects.create(
+            imdb_id="0234215", title="The Matrix Reloaded", kind="movie", year=2003
+        )
+
+        response = self.client.get(
+            "/v1/movies", {"saved": True, "fields": "imdb_id"}, **self.headers
+        )
+
+        self.assertEqual(response.json(), [{"imdb_id": "0133093"}])
+
+    def test_find_movies_with_invalid_fields(self):
+        response = self.client.get(
+            "/v1/movies", {"name": "matrix", "fields": "title,rating"}, **self.headers
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {
+                "message": "Invalid fields: rating. "
+                "Available: title, kind, year, cover_url, imdb_id"
+            },
+        )
+
+    def test_get_movie_with_fields(self):
+        response = self.client.get(
+            "/v1/movies/0133093", {"fields": "title,rating"}, **self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"title": "The Matrix", "rating": 8.7})
+
+    def test_get_movie_with_invalid_fields(self):
+        response = self.client.get(
+            "/v1/movies/0133093", {"fields": "password"}, **self.headers
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FakeImdbMovie(dict):
+    def __init__(self, imdb_id, **data):
+        super().__init__(**data)
+        self.imdb_id = imdb_id
+
+    def getID(self):
+        return self.imdb_id
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_ACTION="raise")
+class QueryBudgetMiddlewareTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def run_middleware(self, view, budget=None):
+        def get_response(request):
+            if budget is not None:
+                request.query_budget = budget
+            view()
+            return HttpResponse()
+
+        return QueryBudgetMiddleware(get_response)(self.factory.get("/movies"))
+
+    def test_counts_queries(self):
+        response = self.run_middleware(lambda: list(User.objects.all()), budget=1)
+
+        self.assertEqual(response["X-Query-Count"], "1")
+        self.assertEqual(len(response.queries), 1)
+
+    def test_transaction_statements_are_not_counted(self):
+        def view():
+            with transaction.atomic():
+                User.objects.exists()
+
+        response = self.run_middleware(view, budget=1)
+
+        self.assertEqual(response["X-Query-Count"], "1")
+
+    def test_budget_exceeded(self):
+        def view():
+            User.objects.exists()
+            Movie.objects.exists()
+
+        with self.assertRaisesMessage(
+            QueryBudgetExceeded, "2 queries exceed the budget of 1 queries"
+        ):
+            self.run_middleware(view, budget=1)
+
+    def test_n_plus_one(self):
+        def view():
+            for pk in range(3):
+                User.objects.filter(pk=pk).exists()
+
+        with self.assertRaisesMessage(
+            QueryBudgetExceeded, "possible N+1, executed 3 times"
+        ):
+            self.run_middleware(view)
+
+    @override_settings(QUERY_BUDGET_ACTION="log")
+    def test_log_action(self):
+        def view():
+            User.objects.exists()
+            Movie.objects.exists()
+
+        with self.assertLogs("core.querybudget", "WARNING") as logs:
+            response = self.run_middleware(view, budget=1)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("GET /movies: 2 queries exceed", logs.output[0])
+
+    @override_settings(QUERY_BUDGET_ENABLED=False)
+    def test_disabled(self):
+        response = self.run_middleware(lambda: User.objects.exists(), budget=0)
+
+        self.assertFalse(response.has_header("X-Query-Count"))
+
+
+class QueryBudgetApiTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.headers = self.auth_headers(self.user)
+        self.movie = self.create_movie()
+
+    def assertQueryCount(self, response, count):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Query-Count"], str(count))
+
+    def test_get_user(self):
+        self.assertQueryCount(self.client.get("/v1/users", **self.headers), 1)
+
+    def test_find_movies(self):
+        response = self.client.get("/v1/movies", {"name": "matrix"}, **self.headers)
+        self.assertQueryCount(response, 1)
+
+    def test_find_saved_movies(self):
+        SavedMovie.objects.create(user=self.user, movie=self.movie)
+        response = self.client.get("/v1/movies", {"saved": True}, **self.headers)
+        self.assertQueryCount(response, 1)
+
+    def test_find_movie_saved_twice(self):
+        SavedMovie.objects.create(user=self.user, movie=self.movie)
+        SavedMovie.objects.create(user=self.user, movie=self.movie)
+
+        response = self.client.get(
+            "/v1/movies", {"saved": True, "fields": "imdb_id"}, **self.headers
+        )
+
+        self.assertQueryCount(response, 1)
+        self.assertEqual(response.json(), [{"imdb_id": "0133093"}])
+
+    @mock.patch("core.api.get_imdb_client")
+    def test_find_movies_on_imdb(self, get_imdb_client):
+        get_imdb_client.return_value.search_movie.return_value = [
+            FakeImdbMovie(
+                str(imdb_id),
+                title=f"Alien {imdb_id}",
+                kind="movie",
+                year=1979,
+                **{"full-size cover url": "https://example.com/alien.jpg"},
+            )
+            for imdb_id in range(5)
+        ]
+
+        response = self.client.get("/v1/movies", {"name": "alien"}, **self.headers)
+
+        # one search and a single bulk insert
+        self.assertQueryCount(response, 2)
+        self.assertEqual(len(response.json()), 5)
+        self.assertEqual(Movie.objects.filter(title__startswith="Alien").count(), 5)
+
+    def test_get_movie(self):
+        response = self.client.get("/v1/movies/0133093", **self.headers)
+        self.assertQueryCount(response, 1)
+
+    def test_save_movie(self):
+        response = self.client.post("/v1/movies/0133093/save", **self.headers)
+        self.assertQueryCount(response, 2)
+
+    def test_remove_saved_movie(self):
+        SavedMovie.objects.create(user=self.user, movie=self.movie)
+        response = self.client.post(
+            "/v1/movies/0133093/remove-from-saved", **self.headers
+        )
+        self.assertQueryCount(response, 3)
+        self.assertFalse(SavedMovie.objects.exists())
+
+
+class WarmupTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.headers = self.auth_headers(self.create_user())
+        self.movie = self.create_movie()
+
+    def test_hot_titles_are_served_from_the_cache(self):
+        warm_hot_titles(limit=10)
+
+        response = self.client.get(
+            "/v1/movies/0133093", {"fields": "title,rating"}, **self.headers
+        )
+
+        self.assertEqual(response.json(), {"title": "The Matrix", "rating": 8.7})
+        self.assertEqual(response["X-Query-Count"], "0")
+
+    def test_hot_titles_do_not_expire(self):
+        warm_hot_titles(limit=10)
+
+        with mock.patch("time.time", return_value=time.time() + 30 * 86400):
+            self.assertIsNotNone(get_cached_movie_details("0133093"))
+
+    def test_incomplete_movies_are_skipped(self):
+        Movie.objects.create(
+            imdb_id="0234215", title="Incomplete", kind="movie", year=2003, rating=7
+        )
+
+        with self.assertLogs("core.warmup", "WARNING"):
+            warm_hot_titles(limit=10)
+
+        self.assertIsNotNone(get_cached_movie_details("0133093"))
+        self.assertIsNone(get_cached_movie_details("0234215"))
+
+    def test_worker_warmup_failures_are_logged(self):
+        with mock.patch(
+            "core.warmup.warm_hot_titles", side_effect=RuntimeError("db is down")
+        ):
+            with self.assertLogs("core.warmup", "ERROR") as logs:
+                warmup_worker()
+
+        self.assertIn("Worker warmup failed", logs.output[0])
+
+
+class CoverServerHandler(SimpleHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        CoverServerHandler.requests.append(self.path)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+def make_image(width=400, height=600, image_format="PNG"):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(output, format=image_format)
+    return output.getvalue()
+
+
+@skipUnless(Image, "Pillow is not installed")
+class CoverTestCase(ApiTestCase):
+    """
+    Covers served by a local file server through the default UrlFetcher
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.files_dir = tempfile.mkdtemp()
+        cls.server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), partial(CoverServerHandler, directory=cls.files_dir)
+        )
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.files_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        CoverServerHandler.requests = []
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def add_cover(self, name, content):
+        with open(os.path.join(self.files_dir, name), "wb") as cover_file:
+            cover_file.write(content)
+        return f"http://127.0.0.1:{self.server.server_port}/{name}"
+
+    def cover_cache(self, max_size=10 * 1024 * 1024):
+        return CoverCache(self.cache_dir, UrlFetcher(timeout=5), max_size)
+
+
+class CoverCacheTest(CoverTestCase):
+    def test_fetch_and_hit(self):
+        url = self.add_cover("cover.png", make_image())
+        cover_cache = self.cover_cache()
+
+        path, etag = cover_cache.get(url)
+        self.assertEqual(path.read_bytes(), make_image())
+        self.assertEqual(etag, hashlib.sha256(make_image()).hexdigest())
+        self.assertEqual(path.name, f"{etag}.png")
+
+        self.assertEqual(cover_cache.get(url), (path, etag))
+        self.assertEqual(CoverServerHandler.requests, ["/cover.png"])
+
+    def test_thumbnail(self):
+        url = self.add_cover("cover.jpg", make_image(image_format="JPEG"))
+        cover_cache = self.cover_cache()
+
+        path, etag = cover_cache.get(url, 100)
+
+        self.assertTrue(path.name.endswith("-w100.jpg"))
+        self.assertTrue(etag.endswith("-w100"))
+        with Image.open(path) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ("JPEG", (100, 150)))
+
+        inode = path.stat().st_ino
+        os.utime(path, (0, 0))
+        self.assertEqual(cover_cache.get(url, 100), (path, etag))
+        # touched on the hit, not generated again
+        self.assertGreater(path.stat().st_mtime, 0)
+        self.assertEqual(path.stat().st_ino, inode)
+        self.assertEqual(len(CoverServerHandler.requests), 1)
+
+    def test_least_recently_used_covers_are_evicted(self):
+        urls = [self.add_cover(f"c{i}.png", make_image(width=50 + i)) for i in range(3)]
+        sizes = [len(make_image(width=50 + i)) for i in range(3)]
+        # room for two covers and their url index entries
+        cover_cache = self.cover_cache(max_size=sizes[1] + sizes[2] + 500)
+
+        hot_path, _ = cover_cache.get(urls[0])
+        for url in urls[1:]:
+            time.sleep(0.01)
+            cover_cache.get(url)
+            time.sleep(0.01)
+            cover_cache.get(urls[0])
+
+        self.assertEqual(CoverServerHandler.requests, ["/c0.png", "/c1.png", "/c2.png"])
+        self.assertTrue(hot_path.exists())
+        self.assertEqual(len(list(Path(self.cache_dir).glob("??/*.png"))), 2)
+
+    def test_cover_bigger_than_the_cache_is_served(self):
+        url = self.add_cover("cover.png", make_image())
+        other_url = self.add_cover("other.png", make_image(width=10))
+        cover_cache = self.cover_cache(max_size=100)
+
+        cover_cache.get(other_url)
+        path, _ = cover_cache.get(url)
+
+        self.assertTrue(path.exists())
+
+    def test_upstream_error(self):
+        cover_cache = self.cover_cache()
+        url = f"http://127.0.0.1:{self.server.server_port}/missing.png"
+
+        with self.assertRaises(CoverFetchException):
+            cover_cache.get(url)
+
+    def test_resize_error(self):
+        url = self.add_cover("broken.png", b"\x89PNG\r\n\x1a\nbroken")
+
+        with self.assertRaises(CoverException):
+            self.cover_cache().get(url, 100)
+
+
+class MovieCoverViewTest(CoverTestCase):
+    def setUp(self):
+        super().setUp()
+        get_cover_cache.cache_clear()
+        self.addCleanup(get_cover_cache.cache_clear)
+        settings_override = override_settings(COVER_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.movie = Movie.objects.create(
+            imdb_id="0133093",
+            title="The Matrix",
+            kind="movie",
+            year=1999,
+            cover_url=self.add_cover("matrix.png", make_image()),
+        )
+
+    def test_cover(self):
+        response = self.client.get("/v1/movies/0133093/cover")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response["Cache-Control"], "public, max-age=86400")
+        self.assertEqual(
+            response["ETag"], f'"{hashlib.sha256(make_image()).hexdigest()}"'
+        )
+        self.assertEqual(b"".join(response.streaming_content), make_image())
+        self.assertEqual(response["X-Query-Count"], "1")
+
+    def test_thumbnail(self):
+        response = self.client.get("/v1/movies/0133093/cover", {"w": 150})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"].endswith('-w200"'))
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (200, 300))
+
+    def test_not_modified(self):
+        etag = self.client.get("/v1/movies/0133093/cover")["ETag"]
+
+        response = self.client.get("/v1/movies/0133093/cover", HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response["Cache-Control"], "public, max-age=86400")
+        self.assertEqual(CoverServerHandler.requests, ["/matrix.png"])
+
+    @mock.patch("core.services.get_imdb_client")
+    def test_unknown_movie(self, get_imdb_client):
+        response = self.client.get("/v1/movies/0000001/cover")
+
+        self.assertEqual(response.status_code, 404)
+        get_imdb_client.assert_not_called()
+
+    def test_invalid_width(self):
+        response = self.client.get("/v1/movies/0133093/cover", {"w": "big"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_upstream_error(self):
+        Movie.objects.filter(pk=self.movie.pk).update(
+            cover_url=f"http://127.0.0.1:{self.server.server_port}/missing.png"
+        )
+
+        response = self.client.get("/v1/movies/0133093/cover")
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(
+            response.json(),
+            {"message": "We had a problem, it's not was possible to get the cover"},
+        )
@@ -1,3 +1,74 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from .covers import (
+    EXTENSION_CONTENT_TYPES,
+    CoverException,
+    get_cover_cache,
+    normalize_width,
+)
+from .models import Movie
+from .querybudget import query_budget
+from .ratelimit import RateLimitExceeded, ip_key, rate_limit
+
+
+def message_response(message: str, status: int) -> JsonResponse:
+    return JsonResponse({"message": message}, status=status)
+
+
+@require_GET
+def movie_cover(request, imdb_id: str):
+    """
+    Movie cover served from our cache, `w` resizes it to the closest
+    supported width. A plain view instead of a NinjaAPI operation so the
+    FileResponse is streamed with the server's wsgi.file_wrapper (sendfile).
+    """
+    try:
+        return _movie_cover(request, imdb_id)
+    except RateLimitExceeded as exc:
+        response = message_response("Too many requests", 429)
+        response["Retry-After"] = str(exc.retry_after)
+        return response
+
+
+@rate_limit("300/m", key=ip_key, scope="movie_cover")
+@query_budget(1)
+def _movie_cover(request, imdb_id: str):
+    try:
+        width = normalize_width(int(request.GET.get("w") or 0))
+    except ValueError:
+        return message_response("w must be an integer", 400)
+
+    # only movies already in our database, so this route never calls IMDb
+    cover_url = (
+        Movie.objects.filter(imdb_id=imdb_id)
+        .values_list("cover_url", flat=True)
+        .first()
+    )
+    if not cover_url:
+        return message_response("Movie not found", 404)
+
+    try:
+        path, etag = get_cover_cache().get(cover_url, width)
+        etag = f'"{etag}"'
+        if request.headers.get("If-None-Match") == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(
+                open(path, "rb"),
+                content_type=EXTENSION_CONTENT_TYPES[path.suffix[1:]],
+            )
+    except (CoverException, OSError):
+        return message_response(
+            "We had a problem, it's not was possible to get the cover", 502
+        )
+
+    # the url is keyed by movie and its cover can change, so clients
+    # revalidate with the ETag once max-age is over
+    response["ETag"] = etag
+    patch_cache_control(
+        response, public=True, max_age=getattr(settings, "COVER_MAX_AGE", 86400)
+    )
+    return response
@@ -0,0 +1,66 @@
+import logging
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from pydantic import ValidationError
+
+logger = logging.getLogger(__name__)
+
+
+def warmup_app():
+    """
+    Run once in the gunicorn master with `preload_app`, so the work is shared
+    copy-on-write by every forked worker
+    """
+    from .api import api
+    from .services import get_imdb_client
+
+    # builds every route schema model and the OpenAPI document
+    api.get_openapi_schema()
+    # imports IMDbPY and creates the client, no request is made
+    get_imdb_client()
+    # database connections can't be shared between processes
+    connections.close_all()
+
+
+def warmup_worker():
+    """
+    Run in each worker before it accepts traffic. Warmup is best-effort, a
+    failure is logged instead of keeping the worker from booting.
+    """
+    try:
+        for connection in connections.all():
+            connection.ensure_connection()
+
+        warm_hot_titles(getattr(settings, "WARMUP_HOT_TITLES", 20))
+    except Exception:
+        logger.exception("Worker warmup failed")
+
+
+def warm_hot_titles(limit: int):
+    """
+    Cache the details of the most saved movies, served by the movie details
+    route without querying the database. Entries never expire, the warm set
+    lives as long as the worker since the default cache is per process.
+    """
+    from .models import Movie
+    from .services import cache_movie_details
+
+    if not limit:
+        return
+
+    movies = (
+        Movie.objects.filter(rating__isnull=False)
+        .annotate(saved_count=Count("savedmovie"))
+        .order_by("-saved_count")[:limit]
+    )
+    cached = 0
+    for movie in movies:
+        try:
+            cache_movie_details(movie)
+            cached += 1
+        except ValidationError:
+            logger.warning("Movie %s has incomplete details", movie.imdb_id)
+
+    logger.info("Warmed up %s hot titles", cached)
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -126,3 +128,50 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Rate limiting
+# "memory" keeps buckets per worker, "cache" shares them through CACHES
+
+RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', cast=bool, default=True)
+RATELIMIT_BACKEND = config('RATELIMIT_BACKEND', default='memory')
+RATELIMIT_CACHE_ALIAS = config('RATELIMIT_CACHE_ALIAS', default='default')
+# number of proxies appending the client IP to X-Forwarded-For, the default
+# matches the Heroku router, use 0 when clients connect to gunicorn directly
+RATELIMIT_PROXY_COUNT = config('RATELIMIT_PROXY_COUNT', cast=int, default=1)
+
+
+# Response compression
+# brotli is only used when the optional `brotli` package is installed
+
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', cast=int, default=1024)
+COMPRESSION_ALGORITHMS = config('COMPRESSION_ALGORITHMS', default='br,gzip', cast=Csv())
+
+
+# Query budgets
+# counts queries per request, set QUERY_BUDGET_ACTION=raise to fail requests
+# that exceed their route budget or run N+1 queries (the tests always raise)
+
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', cast=bool, default=DEBUG)
+QUERY_BUDGET_ACTION = config('QUERY_BUDGET_ACTION', default='log')
+QUERY_BUDGET_DUPLICATE_THRESHOLD = config(
+    'QUERY_BUDGET_DUPLICATE_THRESHOLD', cast=int, default=3
+)
+
+
+# Warmup
+# number of most saved movies cached by each gunicorn worker for its whole
+# life, 0 disables it
+
+WARMUP_HOT_TITLES = config('WARMUP_HOT_TITLES', cast=int, default=20)
+
+
+# Cover images proxy
+# COVER_FETCHER is any class with a `fetch(url) -> bytes` method, COVER_MAX_AGE
+# is how long clients reuse a cover before revalidating it with its ETag
+
+COVER_CACHE_DIR = config('COVER_CACHE_DIR', default=os.path.join(BASE_DIR, 'cover_cache'))
+COVER_CACHE_MAX_SIZE = config('COVER_CACHE_MAX_SIZE', cast=int, default=512 * 1024 * 1024)
+COVER_FETCHER = config('COVER_FETCHER', default='core.covers.UrlFetcher')
+COVER_WIDTHS = (100, 200, 400, 800)
+COVER_MAX_AGE = config('COVER_MAX_AGE', cast=int, default=86400)
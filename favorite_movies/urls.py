@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.urls import path
 from core.api import api
+from core.views import movie_cover
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('v1/movies/<str:imdb_id>/cover', movie_cover, name='movie_cover'),
     path('v1/', api.urls),
 ]
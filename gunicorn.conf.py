@@ -0,0 +1,20 @@
+"""
+Gunicorn config, loaded automatically from the working directory.
+
+The app is preloaded in the master and warmed up before forking, each worker
+then opens its own database connection and primes the hot titles.
+"""
+
+preload_app = True
+
+
+def when_ready(server):
+    from core.warmup import warmup_app
+
+    warmup_app()
+
+
+def post_worker_init(worker):
+    from core.warmup import warmup_worker
+
+    warmup_worker()